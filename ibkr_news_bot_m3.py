@@ -2,49 +2,64 @@
 """
 ibkr_news_bot_m3.py
 
-- Connects to IB Gateway / TWS using ib_insync
+- Connects to IB Gateway / TWS using ib_async (maintained successor of ib_insync)
 - Qualifies contracts for configured tickers
+- Subscribes to real-time news ticks; each push triggers an immediate fetch, with a periodic poll as fallback
 - Requests historical news headlines and (optionally) article bodies
 - Prints results to console and optionally posts to Telegram
 
 Requirements:
-    pip install ib_insync python-dotenv aiohttp
+    pip install ib_async python-dotenv aiohttp aiolimiter
 
 Notes:
  - You must run TWS or IB Gateway locally or remotely and enable API connections.
  - Configure connection and behavior via environment variables or edit CONFIG below.
  - IB historical news delivery depends on provider availability for a given contract.
- - See IB TWS API and ib_insync docs for details.
-   (ib_insync docs: https://ib-insync.readthedocs.io) 
+ - Real-time news ticks require an API news subscription for the providers in IB_NEWS_PROVIDERS.
+ - See IB TWS API and ib_async docs for details.
+   (ib_async docs: https://ib-api-reconnect.github.io/ib_async/)
    (IB API news: https://interactivebrokers.github.io/tws-api/news.html)
 """
 
 import os
+import sys
+import json
+import hashlib
+import re
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, DefaultDict, Optional, Tuple
 
-from ib_insync import IB, Stock, util, Contract
+from ib_async import IB, Stock, util, Contract
 from dotenv import load_dotenv
 
 # Optional Telegram posting
 import aiohttp
+from aiolimiter import AsyncLimiter
 
 # Load .env if present
 load_dotenv()
 
 # ======= CONFIG (change environment variables or edit here) =======
 IB_HOST = os.getenv("IB_HOST", "127.0.0.1")
-IB_PORT = int(os.getenv("IB_PORT", os.getenv("IB_PORT", "4002")))  # 4001/4002 depending on TWS/Gateway mode
-IB_CLIENT_ID = int(os.getenv("IB_CLIENT_ID", os.getenv("IB_CLIENT_ID", "1234")))
+IB_PORT = int(os.getenv("IB_PORT", "4002"))  # 4001/4002 depending on TWS/Gateway mode
+IB_CLIENT_ID = int(os.getenv("IB_CLIENT_ID", "1234"))
 
 # Tickers to monitor (comma-separated env var or default)
 TICKERS = [t.strip() for t in os.getenv("IB_TICKERS", "AAPL,TSLA,SPY").split(",") if t.strip()]
 
-# How often to poll (seconds). Default 600s = 10 minutes
+# How often to poll (seconds) when no news push arrives. Default 600s = 10 minutes
 POLL_SECONDS = int(os.getenv("IB_POLL_SECONDS", "600"))
 
+# After a news push, fetch again this many seconds later in case the historical backend lagged the tick
+NEWS_RECHECK_SECONDS = int(os.getenv("IB_NEWS_RECHECK_SECONDS", "60"))
+
+# News providers for real-time headline ticks (generic tick 292) and historical requests, '+'-separated
+IB_NEWS_PROVIDERS = os.getenv("IB_NEWS_PROVIDERS", "BRFG+BRFUPDN+DJNL")
+
 # How many historical news items to request per ticker each run (max)
 HIST_NEWS_LIMIT = int(os.getenv("IB_HIST_NEWS_LIMIT", "20"))
 
@@ -55,8 +70,35 @@ FETCH_ARTICLE_BODY = os.getenv("IB_FETCH_ARTICLE_BODY", "true").lower() in ("1",
 TELEGRAM_BOT_TOKEN = os.getenv("TG_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TG_CHAT_ID")  # numeric or string id
 
-# Simple local memory of seen article IDs to avoid duplicates across runs
-SEEN_ARTICLE_IDS_FILE = os.getenv("SEEN_IDS_FILE", "seen_article_ids.txt")
+# Telegram rejects messages over 4096 chars; headlines are packed into chunks below this size
+TG_MAX_MESSAGE_CHARS = 4000
+
+# Telegram allows ~30 msg/s per bot, 1 msg/s per private chat and 20 msg/min per group
+TG_LIMITER = AsyncLimiter(25, 1)
+_chat_limiters: Dict[str, AsyncLimiter] = {}
+
+# Simple local memory of seen article IDs to avoid duplicates across runs.
+# Binary file of fixed 12-byte records: 4-byte provider hash + 8-byte articleId hash.
+SEEN_ARTICLE_IDS_FILE = os.getenv("SEEN_IDS_BIN_FILE", "seen_article_ids.bin")
+# Older text format (one "provider:articleId" per line) at the path SEEN_IDS_FILE always pointed to;
+# imported once if the binary file doesn't exist yet
+LEGACY_SEEN_IDS_FILE = os.getenv("SEEN_IDS_FILE", "seen_article_ids.txt")
+
+# Cached {symbol: conId} so restarts don't need to re-qualify every ticker with IB
+CONID_CACHE_FILE = os.getenv("CONID_CACHE", "conids.json")
+
+# Newest headline timestamp seen per symbol; polls only request news since then
+LAST_TS_FILE = os.getenv("LAST_TS_FILE", "last_news_ts.json")
+
+# How far back to look on cold start, and how much to overlap the previous window
+NEWS_LOOKBACK = timedelta(days=7)
+NEWS_OVERLAP = timedelta(minutes=10)
+
+# New ids are appended each loop; rewrite the file deduplicated/trimmed every N loops
+SEEN_IDS_COMPACT_EVERY = int(os.getenv("SEEN_IDS_COMPACT_EVERY", "100"))
+
+# Max article ids remembered per provider; the oldest are evicted (IB news windows are a week at most)
+SEEN_IDS_MAX = int(os.getenv("SEEN_IDS_MAX", "50000"))
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -65,16 +107,179 @@ logger = logging.getLogger("ibkr_news_bot_m3")
 
 # ==============================================================
 
-def load_seen_ids(path: str) -> set:
+class LRUSet:
+    """Set with a size cap; adding past the cap evicts the least recently added item."""
+    __slots__ = ("_d", "_cap")
+
+    def __init__(self, cap: int):
+        self._d = OrderedDict()
+        self._cap = cap
+
+    def __contains__(self, item) -> bool:
+        return item in self._d
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+    def __iter__(self):
+        # oldest first, so a rewritten file reloads in the same eviction order
+        return iter(self._d)
+
+    def add(self, item):
+        self._d[item] = None
+        self._d.move_to_end(item)
+        if len(self._d) > self._cap:
+            self._d.popitem(last=False)
+
+# seen ids are held as provider key -> LRUSet(article key), the same 4 + 8 byte hashes stored on disk,
+# so the hot-path check needs no string building
+SeenIds = DefaultDict[bytes, LRUSet]
+
+PROVIDER_KEY_SIZE = 4
+ARTICLE_KEY_SIZE = 8
+SEEN_ID_RECORD_SIZE = PROVIDER_KEY_SIZE + ARTICLE_KEY_SIZE
+
+# only a handful of provider codes exist, so their keys are memoized
+_provider_keys: Dict[str, bytes] = {}
+
+def provider_key(provider: str) -> bytes:
+    key = _provider_keys.get(provider)
+    if key is None:
+        key = hashlib.blake2b(provider.encode("utf-8"), digest_size=PROVIDER_KEY_SIZE).digest()
+        _provider_keys[provider] = key
+    return key
+
+def article_key(article_id: str) -> bytes:
+    return hashlib.blake2b(article_id.encode("utf-8"), digest_size=ARTICLE_KEY_SIZE).digest()
+
+def new_seen_ids() -> SeenIds:
+    return defaultdict(lambda: LRUSet(SEEN_IDS_MAX))
+
+def news_epoch(nt) -> Optional[int]:
+    # HistoricalNews.time is UTC but ib_async parses it as a naive datetime;
+    # .timestamp() would read a naive value as host-local time, so pin it to UTC first
+    t = getattr(nt, "time", None)
+    if not t:
+        return None
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp())
+
+# per-provider metadata prefix on IB headlines, e.g. "{A:800015:L:en:K:n/a:C:0.97}"
+_HEADLINE_META_RE = re.compile(r"^\s*\{[^}]*\}")
+
+def headline_key(headline: str) -> Optional[bytes]:
+    # providers re-publish the same wire story under different articleIds; key on the normalized text instead.
+    # None for empty headlines, which would otherwise all collide on one key.
+    text = " ".join(_HEADLINE_META_RE.sub("", headline).lower().split())
+    if not text:
+        return None
+    return hashlib.sha1(text.encode("utf-8")).digest()[:8]
+
+def load_seen_ids(path: str) -> SeenIds:
+    if path.endswith(".txt") or os.path.abspath(path) == os.path.abspath(LEGACY_SEEN_IDS_FILE):
+        # never parse (or append binary records to) a text-format seen ids file
+        raise ValueError(f"SEEN_IDS_BIN_FILE={path!r} looks like a text seen-ids file; point it at a separate binary file")
+    ids = new_seen_ids()
+    if not os.path.exists(path):
+        if os.path.exists(LEGACY_SEEN_IDS_FILE):
+            with open(LEGACY_SEEN_IDS_FILE, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    provider, _, article_id = line.partition(":")
+                    ids[provider_key(provider)].add(article_key(article_id))
+            save_seen_ids(path, ids)
+        return ids
+    with open(path, "rb") as f:
+        data = f.read()
+    # ignore a trailing partial record (e.g. from an interrupted append)
+    end = len(data) - len(data) % SEEN_ID_RECORD_SIZE
+    for i in range(0, end, SEEN_ID_RECORD_SIZE):
+        ids[data[i:i + PROVIDER_KEY_SIZE]].add(data[i + PROVIDER_KEY_SIZE:i + SEEN_ID_RECORD_SIZE])
+    return ids
+
+def count_seen_ids(ids: SeenIds) -> int:
+    return sum(len(v) for v in ids.values())
+
+def write_atomic(path: str, data: bytes):
+    # write a sibling temp file and swap it in, so a crash mid-write never leaves a truncated file
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def save_seen_ids(path: str, ids: SeenIds):
+    # full rewrite of only the retained ids, oldest first; used to compact the append-only log
+    write_atomic(path, b"".join(p + a for p, article_keys in ids.items() for a in article_keys))
+
+def append_seen_ids(path: str, new_ids: List[Tuple[bytes, bytes]]):
+    if not new_ids:
+        return
+    with open(path, "ab") as f:
+        f.write(b"".join(p + a for p, a in new_ids))
+
+# Transient failures worth retrying: network errors, timeouts and dropped IB connections
+RETRY_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)
+
+class RetryAfterError(aiohttp.ClientResponseError):
+    """429 response carrying the server's requested wait (Telegram's parameters.retry_after)."""
+    def __init__(self, *args, retry_after: float = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    return min(cap, base * 2 ** attempt)
+
+async def with_retry(coro_fn, *, tries: int = 5, base: float = 1.0, cap: float = 60.0, what: str = "request"):
+    """Await coro_fn(), retrying transient failures with exponential backoff (1s, 2s, 4s, ... capped)."""
+    for attempt in range(tries):
+        try:
+            return await coro_fn()
+        except RETRY_EXCEPTIONS as e:
+            if attempt == tries - 1:
+                raise
+            # never come back before the server said we may
+            delay = max(backoff_delay(attempt, base, cap), getattr(e, "retry_after", 0))
+            logger.warning("%s failed (%r); retry %d/%d in %.0fs", what, e, attempt + 1, tries - 1, delay)
+            await asyncio.sleep(delay)
+
+def chat_limiter(chat_id: str) -> AsyncLimiter:
+    limiter = _chat_limiters.get(chat_id)
+    if limiter is None:
+        # group/channel ids are negative
+        limiter = AsyncLimiter(20, 60) if str(chat_id).startswith("-") else AsyncLimiter(1, 1)
+        _chat_limiters[chat_id] = limiter
+    return limiter
+
+def load_conid_cache(path: str) -> Dict[str, int]:
     if not os.path.exists(path):
-        return set()
-    with open(path, "r", encoding="utf-8") as f:
-        return {line.strip() for line in f if line.strip()}
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {k: int(v) for k, v in json.load(f).items()}
+    except Exception:
+        logger.exception("Could not read %s; contracts will be qualified with IB", path)
+        return {}
+
+def save_conid_cache(path: str, conids: Dict[str, int]):
+    write_atomic(path, json.dumps(conids, indent=2, sort_keys=True).encode("utf-8"))
+
+def load_last_ts(path: str) -> Dict[str, int]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {k: int(v) for k, v in json.load(f).items()}
+    except Exception:
+        logger.exception("Could not read %s; starting with a full lookback window", path)
+        return {}
 
-def save_seen_ids(path: str, ids: set):
-    with open(path, "w", encoding="utf-8") as f:
-        for _id in sorted(ids):
-            f.write(f"{_id}\n")
+def save_last_ts(path: str, last_ts: Dict[str, int]):
+    write_atomic(path, json.dumps(last_ts, indent=2, sort_keys=True).encode("utf-8"))
 
 async def post_to_telegram(session: aiohttp.ClientSession, text: str):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
@@ -82,182 +287,366 @@ async def post_to_telegram(session: aiohttp.ClientSession, text: str):
         return
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "disable_web_page_preview": True}
+
+    async def send():
+        async with chat_limiter(TELEGRAM_CHAT_ID), TG_LIMITER:
+            async with session.post(url, json=payload) as resp:
+                if resp.status == 429:
+                    txt = await resp.text()
+                    try:
+                        retry_after = float(json.loads(txt).get("parameters", {}).get("retry_after", 0))
+                    except (ValueError, AttributeError):
+                        retry_after = 0
+                    # TG_LIMITER / chat_limiter should keep us under Telegram's limits; a 429 means they are too loose
+                    logger.warning("Telegram rate limit hit (retry_after=%ss); check TG_LIMITER/chat_limiter settings", retry_after)
+                    raise RetryAfterError(
+                        resp.request_info, resp.history, status=resp.status, message=txt, retry_after=retry_after
+                    )
+                if resp.status >= 500:
+                    # server-side error: raise so with_retry backs off and resends
+                    raise aiohttp.ClientResponseError(
+                        resp.request_info, resp.history, status=resp.status, message=await resp.text()
+                    )
+                if resp.status != 200:
+                    txt = await resp.text()
+                    logger.warning("Telegram post failed %s: %s", resp.status, txt)
+
     try:
-        async with session.post(url, json=payload, timeout=10) as resp:
-            if resp.status != 200:
-                txt = await resp.text()
-                logger.warning("Telegram post failed %s: %s", resp.status, txt)
+        await with_retry(send, what="Telegram post")
     except Exception:
         logger.exception("Exception while posting to Telegram")
 
-def short_time_ago(ts: Optional[int]) -> str:
+def pack_messages(lines: List[str], limit: int = TG_MAX_MESSAGE_CHARS) -> List[str]:
+    """Greedily join lines with newlines into as few messages of at most `limit` chars as possible."""
+    chunks = []
+    current = []
+    size = 0
+    for line in lines:
+        line = line[:limit]
+        extra = len(line) + (1 if current else 0)
+        if current and size + extra > limit:
+            chunks.append("\n".join(current))
+            current = []
+            extra = len(line)
+            size = 0
+        current.append(line)
+        size += extra
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+# (upper bound in seconds, divisor, suffix) for short_time_ago
+_AGO_UNITS = ((60, 1, "s"), (3600, 60, "m"), (86400, 3600, "h"))
+
+def short_time_ago(ts: Optional[int], now_epoch: int) -> str:
     if ts is None or ts == 0:
         return "unknown time"
-    # IB sends timestamps as epoch seconds (usually)
-    dt = datetime.fromtimestamp(ts)
-    diff = datetime.now() - dt
-    s = int(diff.total_seconds())
-    if s < 60:
-        return f"{s}s ago"
-    if s < 3600:
-        return f"{s//60}m ago"
-    if s < 86400:
-        return f"{s//3600}h ago"
-    return dt.isoformat(" ", "seconds")
-
-async def fetch_and_publish_news(ib: IB, contracts: Dict[str, Contract], seen_ids: set, session: Optional[aiohttp.ClientSession]):
+    # ts is epoch seconds (see news_epoch); now_epoch is read once per poll by the caller
+    # clamp so small clock skew between us and IB never shows a negative age
+    s = max(0, now_epoch - int(ts))
+    for bound, div, suffix in _AGO_UNITS:
+        if s < bound:
+            return f"{s // div}{suffix} ago"
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+async def qualify_contracts(ib: IB, pending: List[Contract]):
+    """Qualify contracts in one batch; qualifyContractsAsync fills conId in place."""
+    logger.debug("Qualifying contracts...")
+    try:
+        await ib.qualifyContractsAsync(*pending)
+    except Exception:
+        logger.exception("Error qualifying contracts")
+    for contr in pending:
+        if contr.conId:
+            logger.debug("Qualified %s -> conId=%s", contr.symbol, contr.conId)
+        else:
+            logger.warning("Could not qualify %s; will retry on next poll", contr.symbol)
+
+async def fetch_and_publish_news(ib: IB, contracts: Dict[str, Contract], seen_ids: SeenIds, seen_hashes: LRUSet, last_ts: Dict[str, int], session: Optional[aiohttp.ClientSession]) -> List[Tuple[bytes, bytes]]:
     """
     For each contract, request historical news headlines and optionally article bodies.
-    Uses ib.reqHistoricalNewsAsync under the hood (ib_insync wrapper).
+    Uses ib.reqHistoricalNewsAsync under the hood (ib_async wrapper).
+    All tickers are requested concurrently over the single IB connection.
+    Headlines whose normalized text hash is in seen_hashes are dropped as cross-provider duplicates.
+    Only news since the newest timestamp in last_ts (minus a small overlap) is requested; last_ts is updated in place.
+    Returns the (provider key, article key) pairs added to seen_ids during this call.
     """
-    # We'll use an increasing reqId
-    req_id = 1000
-    for symbol, contract in contracts.items():
+    new_ids = []
+    now_epoch = int(time.time())
+    # Telegram posts run as background tasks while other tickers are still being fetched
+    tg_tasks = []
+    post_tg = bool(session and TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)
+    # console output for the whole poll, written with a single stdout write at the end
+    output_buf = []
+
+    async def fetch_one(symbol: str, contract: Contract):
         try:
             logger.info("Requesting news for %s (conId=%s)", symbol, getattr(contract, "conId", "N/A"))
-            # If we don't have a conId, try to qualify the contract:
+            # Qualification is main_loop's job; an unqualified contract is just skipped this poll
             if not getattr(contract, "conId", None):
-                logger.debug("No conId for %s; trying to qualify contract", symbol)
-                details = ib.qualifyContracts(contract)
-                if not details:
-                    logger.warning("Could not qualify contract for %s; skipping", symbol)
-                    continue
-                contract = details[0].contract
+                logger.warning("No conId for %s; skipping", symbol)
+                return
 
             conId = contract.conId
 
-            # providerCodes: empty string "" requests all known providers (may behave differently per IB config)
-            provider_codes = ""
+            # providerCodes: '+'-separated list, the same providers the real-time news subscription uses
+            provider_codes = IB_NEWS_PROVIDERS
 
             # Request historical news; using async variant so we can await it without registering explicit callbacks.
-            # Signature in ib_insync: reqHistoricalNewsAsync(reqId, conId, providerCodes, startDateTime, endDateTime, totalResults, options=None)
-            # Use timeframe: last 7 days (ISO formatted times) to reduce results; IB may ignore depending on provider.
-            end_dt = datetime.utcnow()
-            start_dt = end_dt - timedelta(days=7)
+            # Signature in ib_async: reqHistoricalNewsAsync(conId, providerCodes, startDateTime, endDateTime, totalResults, historicalNewsOptions=[])
+            # Use timeframe: since the newest headline we already have (cold start: last 7 days); IB may ignore depending on provider.
+            # Items in the overlap are dropped by the seen_ids check below.
+            end_dt = datetime.now(timezone.utc)
+            start_dt = end_dt - NEWS_LOOKBACK
+            if last_ts.get(symbol):
+                start_dt = max(start_dt, datetime.fromtimestamp(last_ts[symbol], timezone.utc) - NEWS_OVERLAP)
             start_str = start_dt.strftime("%Y%m%d %H:%M:%S")
             end_str = end_dt.strftime("%Y%m%d %H:%M:%S")
 
-            # Call async method
-            news_ticks = await ib.reqHistoricalNewsAsync(req_id, conId, provider_codes, start_str, end_str, HIST_NEWS_LIMIT)
-            # news_ticks is a list of NewsTick-like objects with fields: providerCode, articleId, headline, timeStamp, extraData
+            # Call async method; ib_async assigns its own reqId, so concurrent requests are safe.
+            # It times out internally and returns None then; raise so with_retry backs off and retries.
+            async def request_news():
+                result = await ib.reqHistoricalNewsAsync(conId, provider_codes, start_str, end_str, HIST_NEWS_LIMIT)
+                if result is None:
+                    raise asyncio.TimeoutError("historical news request timed out")
+                return result
+
+            news_ticks = await with_retry(request_news, what=f"Historical news request for {symbol}")
+            # news_ticks is a list of HistoricalNews objects with fields: time (UTC datetime), providerCode, articleId, headline
             logger.debug("Received %d news ticks for %s", len(news_ticks) if news_ticks else 0, symbol)
 
             if not news_ticks:
                 logger.info("No news for %s", symbol)
-                req_id += 1
-                continue
+                return
+
+            newest = max((t for t in map(news_epoch, news_ticks) if t), default=None)
+            if newest:
+                last_ts[symbol] = max(newest, last_ts.get(symbol, 0))
 
+            new_ticks = []
+            tg_lines = []
             for nt in news_ticks:
-                # Construct a stable article key to deduplicate. Some exchanges/providers may include providerCode + articleId
-                article_key = f"{getattr(nt, 'providerCode', '')}:{getattr(nt, 'articleId', '')}"
-                if article_key in seen_ids:
-                    logger.debug("Already seen %s, skipping", article_key)
+                # Deduplicate on providerCode + articleId first, before touching any other field.
+                # Mark seen right away so a concurrent ticker returning the same article skips it too.
+                provider = nt.providerCode
+                article_id = nt.articleId
+                p_key = provider_key(provider)
+                a_key = article_key(article_id)
+                provider_seen = seen_ids[p_key]
+                if a_key in provider_seen:
                     continue
+                provider_seen.add(a_key)
+                new_ids.append((p_key, a_key))
+                h = headline_key(getattr(nt, "headline", "") or "")
+                if h is not None:
+                    if h in seen_hashes:
+                        logger.debug("Duplicate headline %s:%s, skipping", provider, article_id)
+                        continue
+                    seen_hashes.add(h)
+                new_ticks.append((provider, article_id, nt))
+
+            # Request all article bodies for this ticker in one overlapped batch;
+            # exceptions are returned per item so one provider failure does not poison the rest
+            arts = [None] * len(new_ticks)
+            if FETCH_ARTICLE_BODY and new_ticks:
+                # note: IB's reqNewsArticle uses provider and articleId fields
+                art_coros = [
+                    ib.reqNewsArticleAsync(provider, article_id)
+                    for provider, article_id, _ in new_ticks
+                ]
+                arts = await asyncio.gather(*art_coros, return_exceptions=True)
 
-                ts = getattr(nt, "timeStamp", None)
+            for (provider, article_id, nt), art in zip(new_ticks, arts):
+                ts = news_epoch(nt)
                 headline = getattr(nt, "headline", "") or ""
                 extra = getattr(nt, "extraData", "") or ""
-                provider = getattr(nt, "providerCode", "")
 
                 # Format and print
                 out_lines = [
-                    f"=== {symbol} | {provider} | {short_time_ago(ts)} ===",
+                    f"=== {symbol} | {provider} | {short_time_ago(ts, now_epoch)} ===",
                     f"Headline: {headline}",
                 ]
                 if extra:
                     out_lines.append(f"Extra: {extra}")
 
-                article_body = None
-                if FETCH_ARTICLE_BODY:
-                    # request the article body via reqNewsArticle (sync wrapper in ib_insync):
-                    try:
-                        # note: IB's reqNewsArticle uses provider and articleId fields
-                        art = ib.reqNewsArticle(getattr(nt, "providerCode", ""), getattr(nt, "articleId", ""))
-                        # art will typically be a tuple or object — ib_insync returns a string body if available (check docs)
-                        article_body = art if isinstance(art, str) else str(art)
-                        if article_body:
-                            out_lines.append("--- Article body (truncated) ---")
-                            out_lines.append(article_body[:2000])  # truncate to keep output manageable
-                    except Exception:
-                        logger.exception("Failed to fetch article body for %s", article_key)
-
-                # join and publish to console
-                text = "\n".join(out_lines)
-                print(text)
-                print()
-
-                # Optionally post to Telegram
-                if session and TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-                    try:
-                        await post_to_telegram(session, f"{symbol} — {headline}\n{provider}\n{short_time_ago(ts)}")
-                    except Exception:
-                        logger.exception("Telegram post failure")
+                if isinstance(art, BaseException):
+                    logger.error("Failed to fetch article body for %s:%s", provider, article_id, exc_info=art)
+                elif art is not None:
+                    # ib_async returns a NewsArticle(articleType, articleText); take the text directly instead of str()-ing the object
+                    body = art if isinstance(art, str) else getattr(art, "articleText", "") or ""
+                    snippet = body[:2000]  # truncate to keep output manageable
+                    del body
+                    if snippet:
+                        out_lines.append("--- Article body (truncated) ---")
+                        out_lines.append(snippet)
+
+                # join and queue for the console
+                output_buf.append("\n".join(out_lines) + "\n\n")
 
-                # mark seen
-                seen_ids.add(article_key)
+                tg_lines.append(f"{symbol} — {headline} | {provider} | {short_time_ago(ts, now_epoch)}")
 
-            req_id += 1
+            # Optionally post to Telegram, coalescing this ticker's headlines into as few messages as possible
+            if post_tg and tg_lines:
+                for msg in pack_messages(tg_lines):
+                    tg_tasks.append(asyncio.create_task(post_to_telegram(session, msg)))
 
         except Exception:
             logger.exception("Exception while fetching news for %s", symbol)
 
+    await asyncio.gather(*[fetch_one(s, c) for s, c in contracts.items()], return_exceptions=True)
+
+    if output_buf:
+        sys.stdout.write("".join(output_buf))
+        sys.stdout.flush()
+
+    # post_to_telegram logs its own failures; wait so the poll doesn't end with posts in flight
+    if tg_tasks:
+        for res in await asyncio.gather(*tg_tasks, return_exceptions=True):
+            if isinstance(res, BaseException):
+                logger.error("Telegram post failure", exc_info=res)
+
+    return new_ids
+
 
 async def main_loop():
     # load seen ids
-    seen_ids = load_seen_ids(SEEN_ARTICLE_IDS_FILE)
-    logger.info("Loaded %d seen article ids", len(seen_ids))
+    # file I/O runs in a worker thread so the event loop (IB socket, Telegram posts) never blocks on disk
+    seen_ids = await asyncio.to_thread(load_seen_ids, SEEN_ARTICLE_IDS_FILE)
+    logger.info("Loaded %d seen article ids", count_seen_ids(seen_ids))
+    last_ts = await asyncio.to_thread(load_last_ts, LAST_TS_FILE)
+    # headline hashes are only kept in memory; articleIds already cover restarts
+    seen_hashes = LRUSet(SEEN_IDS_MAX)
 
     ib = IB()
     util.useQt(False)  # ensure non-Qt loop (works in headless environments)
     try:
         logger.info("Connecting to IB at %s:%s (clientId=%s)...", IB_HOST, IB_PORT, IB_CLIENT_ID)
-        ib.connect(IB_HOST, IB_PORT, clientId=IB_CLIENT_ID, timeout=10)
+        await ib.connectAsync(IB_HOST, IB_PORT, clientId=IB_CLIENT_ID, timeout=10)
         if not ib.isConnected():
             logger.error("Could not connect to IB (is TWS/IB Gateway running and API enabled?). Exiting.")
             return
 
-        # Build Contract objects
+        # Build Contract objects; symbols with a cached conId skip qualification entirely
+        conid_cache = await asyncio.to_thread(load_conid_cache, CONID_CACHE_FILE)
         contracts = {}
+        to_qualify = []
+        # symbols using a cached conId; re-qualified by symbol if IB rejects the conId
+        from_cache = set()
         for t in TICKERS:
-            # default to US stock on SMART exchange
-            c = Stock(symbol=t, exchange="SMART", currency="USD")
+            if conid_cache.get(t):
+                c = Contract(secType="STK", conId=conid_cache[t], symbol=t, exchange="SMART", currency="USD")
+                from_cache.add(t)
+            else:
+                # default to US stock on SMART exchange
+                c = Stock(symbol=t, exchange="SMART", currency="USD")
+                to_qualify.append(c)
             contracts[t] = c
+        logger.debug("Using cached conIds for %d of %d tickers", len(contracts) - len(to_qualify), len(contracts))
 
-        # Optionally create aiohttp session if Telegram configured
+        # Qualify the remaining contracts once (conIds are stable)
+        if to_qualify:
+            await qualify_contracts(ib, to_qualify)
+
+        # Optionally create aiohttp session if Telegram configured.
+        # One long-lived session with keep-alive so every post reuses the same TLS connection.
         session = None
         if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-            session = aiohttp.ClientSession()
-
-        # Loop forever, polling every POLL_SECONDS
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=75, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+
+        # Subscribe to real-time headlines; a push wakes the loop so news is fetched right away
+        # instead of waiting out POLL_SECONDS. The historical request then backfills and attributes it.
+        # If the historical backend lags the tick, the immediate fetch comes back empty, so one
+        # delayed re-check is scheduled per burst of pushes.
+        news_pushed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        recheck = None
+
+        def on_news_tick(news_tick):
+            nonlocal recheck
+            logger.debug("News push: %s %s", news_tick.providerCode, news_tick.articleId)
+            # ib_async keeps every NewsTick in ib.newsTicks() forever; the payload is not needed after this
+            ib.newsTicks().clear()
+            news_pushed.set()
+            if recheck is not None:
+                recheck.cancel()
+            recheck = loop.call_later(NEWS_RECHECK_SECONDS, news_pushed.set)
+
+        def subscribe_news(contr: Contract):
+            ib.reqMktData(contr, f"mdoff,292:{IB_NEWS_PROVIDERS}", False, False)
+
+        # A cached conId that IB rejects (error 200: no security definition) is stale;
+        # it is dropped and re-qualified by symbol at the top of the next poll
+        stale_symbols = set()
+
+        def on_ib_error(reqId, errorCode, errorString, contract):
+            if errorCode != 200 or contract is None:
+                return
+            for sym in from_cache:
+                if contracts[sym].conId == contract.conId:
+                    logger.warning("IB rejected cached conId %s for %s: %s", contract.conId, sym, errorString)
+                    stale_symbols.add(sym)
+
+        ib.errorEvent += on_ib_error
+        ib.tickNewsEvent += on_news_tick
+        for contr in contracts.values():
+            if contr.conId:
+                subscribe_news(contr)
+
+        # Loop forever: fetch on every news push, or every POLL_SECONDS at the latest
+        loop_count = 0
+        error_streak = 0
         while True:
             try:
-                # Ensure contracts are qualified (get conId)
-                logger.debug("Qualifying contracts...")
-                for sym, contr in list(contracts.items()):
-                    try:
-                        details = ib.qualifyContracts(contr)
-                        if details:
-                            # details[0] is ContractDetails; extract contract
-                            contracts[sym] = details[0].contract
-                            logger.debug("Qualified %s -> conId=%s", sym, details[0].contract.conId)
-                        else:
-                            logger.warning("Could not qualify %s", sym)
-                    except Exception:
-                        logger.exception("Error qualifying %s", sym)
+                # Replace rejected cached contracts so they are qualified by symbol just below
+                for sym in stale_symbols:
+                    ib.cancelMktData(contracts[sym])
+                    contracts[sym] = Stock(symbol=sym, exchange="SMART", currency="USD")
+                    from_cache.discard(sym)
+                stale_symbols.clear()
+
+                # Retry qualification only for contracts that failed before
+                unqualified = [c for c in contracts.values() if not c.conId]
+                if unqualified:
+                    await qualify_contracts(ib, unqualified)
+                    for contr in unqualified:
+                        if contr.conId:
+                            subscribe_news(contr)
 
                 # Fetch and publish news
-                await fetch_and_publish_news(ib, contracts, seen_ids, session)
-
-                # persist seen ids to disk periodically (after each loop)
-                save_seen_ids(SEEN_ARTICLE_IDS_FILE, seen_ids)
-                logger.debug("Saved %d seen ids", len(seen_ids))
-
-                logger.info("Sleeping for %s seconds...", POLL_SECONDS)
-                await asyncio.sleep(POLL_SECONDS)
+                new_ids = await fetch_and_publish_news(ib, contracts, seen_ids, seen_hashes, last_ts, session)
+
+                # persist seen ids: append only the new ones, compact the file periodically
+                loop_count += 1
+                if loop_count % SEEN_IDS_COMPACT_EVERY == 0:
+                    await asyncio.to_thread(save_seen_ids, SEEN_ARTICLE_IDS_FILE, seen_ids)
+                    logger.debug("Compacted %d seen ids", count_seen_ids(seen_ids))
+                else:
+                    await asyncio.to_thread(append_seen_ids, SEEN_ARTICLE_IDS_FILE, new_ids)
+                    logger.debug("Appended %d new seen ids", len(new_ids))
+                await asyncio.to_thread(save_last_ts, LAST_TS_FILE, last_ts)
+
+                # persist conIds for the configured tickers (re-qualified ones overwrite, removed tickers drop out)
+                conids = {sym: c.conId for sym, c in contracts.items() if c.conId}
+                if conids != conid_cache:
+                    await asyncio.to_thread(save_conid_cache, CONID_CACHE_FILE, conids)
+                    conid_cache = conids
+                error_streak = 0
+
+                logger.info("Waiting up to %s seconds for news...", POLL_SECONDS)
+                try:
+                    await asyncio.wait_for(news_pushed.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                news_pushed.clear()
 
             except Exception:
-                logger.exception("Unhandled exception in main loop; will continue after short delay.")
-                await asyncio.sleep(10)
+                delay = backoff_delay(error_streak)
+                error_streak += 1
+                logger.exception("Unhandled exception in main loop; will continue in %.0fs.", delay)
+                await asyncio.sleep(delay)
 
     finally:
         try: